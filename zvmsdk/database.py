@@ -404,22 +404,21 @@ class FCPDbOperator(object):
     def unreserve_fcps(self, fcp_ids):
         if not fcp_ids:
             return
-        fcp_update_info = []
-        for fcp_id in fcp_ids:
-            fcp_update_info.append((fcp_id,))
         with get_fcp_conn() as conn:
-            conn.executemany("UPDATE fcp SET reserved=0, tmpl_id='' "
-                             "WHERE fcp_id=?", fcp_update_info)
+            conn.execute("UPDATE fcp SET reserved=0, tmpl_id='' "
+                         "WHERE fcp_id IN (%s)" %
+                         ','.join('?' * len(fcp_ids)),
+                         list(fcp_ids))
 
     def reserve_fcps(self, fcp_ids, assigner_id, fcp_template_id):
-        fcp_update_info = []
-        for fcp_id in fcp_ids:
-            fcp_update_info.append(
-                (assigner_id, fcp_template_id, fcp_id))
+        if not fcp_ids:
+            return
         with get_fcp_conn() as conn:
-            conn.executemany("UPDATE fcp "
-                             "SET reserved=1, assigner_id=?, tmpl_id=? "
-                             "WHERE fcp_id=?", fcp_update_info)
+            conn.execute("UPDATE fcp "
+                         "SET reserved=1, assigner_id=?, tmpl_id=? "
+                         "WHERE fcp_id IN (%s)" %
+                         ','.join('?' * len(fcp_ids)),
+                         [assigner_id, fcp_template_id] + list(fcp_ids))
 
     def bulk_insert_zvm_fcp_info_into_fcp_table(self, fcp_info_list: list):
         """Insert multiple records into fcp table witch fcp info queried
@@ -548,6 +547,26 @@ class FCPDbOperator(object):
 
         return assigner_id, reserved, connections, tmpl_id
 
+    def get_usage_of_fcps(self, fcp_ids):
+        """Get the usage of multiple FCP devices in one query
+
+        :param fcp_ids: (list) a list of FCP devices
+        :return: (list) a list of
+            (fcp_id, assigner_id, reserved, connections, tmpl_id) tuples;
+            FCP devices not found in DB are left out
+        """
+        if not fcp_ids:
+            return []
+        with get_fcp_conn() as conn:
+            result = conn.execute("SELECT fcp_id, assigner_id, reserved, "
+                                  "connections, tmpl_id "
+                                  "FROM fcp "
+                                  "WHERE fcp_id IN (%s)" %
+                                  ','.join('?' * len(fcp_ids)),
+                                  list(fcp_ids))
+            fcp_info = result.fetchall()
+        return [tuple(fcp) for fcp in fcp_info]
+
     def update_usage_of_fcp(self, fcp, assigner_id, reserved, connections,
                             fcp_template_id):
         with get_fcp_conn() as conn:
@@ -564,26 +583,63 @@ class FCPDbOperator(object):
         :return connections: (dict) the connections of the FCP device
         """
         with get_fcp_conn() as conn:
-            result = conn.execute("SELECT connections FROM fcp "
+            # fuse the existence check and the increment into one UPDATE,
+            # rowcount is 0 only when no row matched the WHERE clause
+            result = conn.execute("UPDATE fcp SET connections=connections+1 "
                                   "WHERE fcp_id=? AND assigner_id=?",
                                   (fcp, assigner_id))
-            fcp_info = result.fetchone()
-            if not fcp_info:
+            if result.rowcount == 0:
                 msg = 'FCP with id: %s does not exist in DB.' % fcp
                 LOG.error(msg)
                 obj_desc = "FCP with id: %s" % fcp
                 raise exception.SDKObjectNotExistError(obj_desc=obj_desc,
                                                        modID=self._module_id)
-            connections = fcp_info['connections'] + 1
-
-            conn.execute("UPDATE fcp SET connections=? WHERE fcp_id=? "
-                         "AND assigner_id=?", (connections, fcp, assigner_id))
             # check the result
             result = conn.execute("SELECT connections FROM fcp "
                                   "WHERE fcp_id=?", (fcp,))
             connections = result.fetchone()['connections']
             return connections
 
+    def increase_connections_of_fcps(self, fcp_ids, assigner_id):
+        """Increase connections of multiple FCP devices in one transaction
+
+        :param fcp_ids: (list) a list of FCP devices
+        :param assigner_id: (str) the userid of the virtual machine
+        :return: (dict) the connections per FCP device after the increase,
+            for example {'1a10': 1, '1b10': 2}
+        """
+        if not fcp_ids:
+            return {}
+        in_clause = ','.join('?' * len(fcp_ids))
+        with get_fcp_conn() as conn:
+            # verify all the FCP devices are allocated to the assigner
+            # before updating any of them, so a failure leaves the
+            # connections of the whole list untouched
+            result = conn.execute("SELECT fcp_id FROM fcp "
+                                  "WHERE fcp_id IN (%s) "
+                                  "AND assigner_id=?" % in_clause,
+                                  list(fcp_ids) + [assigner_id])
+            found = {row['fcp_id'].lower() for row in result.fetchall()}
+            for fcp in fcp_ids:
+                if fcp.lower() not in found:
+                    msg = 'FCP with id: %s does not exist in DB.' % fcp
+                    LOG.error(msg)
+                    obj_desc = "FCP with id: %s" % fcp
+                    raise exception.SDKObjectNotExistError(
+                        obj_desc=obj_desc, modID=self._module_id)
+            conn.execute("UPDATE fcp SET connections=connections+1 "
+                         "WHERE fcp_id IN (%s) "
+                         "AND assigner_id=?" % in_clause,
+                         list(fcp_ids) + [assigner_id])
+            # check the result;
+            # key by lower case so callers can index the dict
+            # with their normalized device numbers
+            result = conn.execute("SELECT fcp_id, connections FROM fcp "
+                                  "WHERE fcp_id IN (%s)" % in_clause,
+                                  list(fcp_ids))
+            return {row['fcp_id'].lower(): row['connections']
+                    for row in result.fetchall()}
+
     def decrease_connections(self, fcp):
         """Decrease connections of the given FCP device
 
@@ -591,33 +647,24 @@ class FCPDbOperator(object):
         :return connections: (dict) the connections of the FCP device
         """
         with get_fcp_conn() as conn:
-
-            result = conn.execute("SELECT connections FROM fcp "
-                                  "WHERE fcp_id=?", (fcp,))
-            fcp_list = result.fetchone()
-            if not fcp_list:
-                msg = 'FCP with id: %s does not exist in DB.' % fcp
-                LOG.error(msg)
-                obj_desc = "FCP with id: %s" % fcp
-                raise exception.SDKObjectNotExistError(obj_desc=obj_desc,
-                                                       modID=self._module_id)
-            connections = fcp_list['connections']
-            if connections == 0:
-                msg = 'FCP with id: %s no connections in DB.' % fcp
+            # decrease connections by 1,
+            # the connections>0 guard keeps the counter from going negative
+            result = conn.execute("UPDATE fcp SET connections=connections-1 "
+                                  "WHERE fcp_id=? AND connections>0", (fcp,))
+            if result.rowcount == 0:
+                # either the FCP does not exist or its connections is
+                # already 0, query once to tell the two cases apart
+                result = conn.execute("SELECT connections FROM fcp "
+                                      "WHERE fcp_id=?", (fcp,))
+                fcp_list = result.fetchone()
+                if not fcp_list:
+                    msg = 'FCP with id: %s does not exist in DB.' % fcp
+                else:
+                    msg = 'FCP with id: %s no connections in DB.' % fcp
                 LOG.error(msg)
                 obj_desc = "FCP with id: %s" % fcp
                 raise exception.SDKObjectNotExistError(obj_desc=obj_desc,
                                                        modID=self._module_id)
-            else:
-                connections -= 1
-            if connections < 0:
-                connections = 0
-                LOG.warning("Warning: connections of fcp is negative",
-                            fcp)
-            # decrease connections by 1
-            conn.execute("UPDATE fcp SET connections=? "
-                         "WHERE fcp_id=?",
-                         (connections, fcp))
             # check the result
             result = conn.execute("SELECT connections FROM fcp "
                                   "WHERE fcp_id=?", (fcp, ))
@@ -640,6 +687,37 @@ class FCPDbOperator(object):
 
         return connections
 
+    def get_connections_of_fcps(self, fcp_ids):
+        """Get the connections of multiple FCP devices in one query
+
+        :param fcp_ids: (list) a list of FCP devices
+        :return: (dict) the connections per FCP device, for example
+            {'1a10': 1, '1b10': 0}
+            FCP devices not found in DB are left out
+        """
+        if not fcp_ids:
+            return {}
+        with get_fcp_conn() as conn:
+            result = conn.execute("SELECT fcp_id, connections FROM fcp "
+                                  "WHERE fcp_id IN (%s)" %
+                                  ','.join('?' * len(fcp_ids)),
+                                  list(fcp_ids))
+            fcp_info = result.fetchall()
+        # key by lower case so callers can index the dict
+        # with their normalized device numbers
+        return {fcp['fcp_id'].lower(): fcp['connections']
+                for fcp in fcp_info}
+
+    def fcp_exist_in_db(self, fcp_id: str):
+        with get_fcp_conn() as conn:
+            query_sql = conn.execute("SELECT fcp_id FROM fcp "
+                                     "WHERE fcp_id=?", (fcp_id,))
+            query_ids = query_sql.fetchall()
+        if query_ids:
+            return True
+        else:
+            return False
+
     def get_all(self):
         with get_fcp_conn() as conn:
 
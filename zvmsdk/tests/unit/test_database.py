@@ -673,6 +673,124 @@ class FCPDbOperatorTestCase(base.SDKTestCase):
         finally:
             self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
 
+    def test_fcp_exist_in_db(self):
+        """Test API fcp_exist_in_db"""
+        # pre create data in FCP DB for test
+        template_id = 'fakehost-1111-1111-1111-111111111111'
+        fcp_info_list = [('1111', '', 0, 0, 'c05076de33000111',
+                          'c05076de33002641', '27', '02e4', 'free', 'user1',
+                          template_id)]
+        fcp_id_list = [fcp_info[0] for fcp_info in fcp_info_list]
+        # delete dirty data from other test cases
+        self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+        # insert new test data
+        self._insert_data_into_fcp_table(fcp_info_list)
+        try:
+            self.assertTrue(self.db_op.fcp_exist_in_db('1111'))
+            # fcp_id column is COLLATE NOCASE
+            self.assertTrue(self.db_op.fcp_exist_in_db('1111'.upper()))
+            self.assertFalse(self.db_op.fcp_exist_in_db('xxxx'))
+        finally:
+            self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+
+    def test_get_usage_of_fcps(self):
+        """Test API get_usage_of_fcps"""
+        # pre create data in FCP DB for test
+        template_id = 'fakehost-1111-1111-1111-111111111111'
+        fcp_info_list = [('1111', 'user1', 2, 1, 'c05076de33000111',
+                          'c05076de33002641', '27', '02e4', 'active', 'user1',
+                          template_id),
+                         ('2222', '', 0, 0, 'c05076de33000222',
+                          'c05076de33002641', '27', '02e4', 'free', 'none',
+                          '')]
+        fcp_id_list = [fcp_info[0] for fcp_info in fcp_info_list]
+        # delete dirty data from other test cases
+        self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+        # insert new test data
+        self._insert_data_into_fcp_table(fcp_info_list)
+        try:
+            self.assertEqual([], self.db_op.get_usage_of_fcps([]))
+            # FCP devices not found in DB are left out
+            result = self.db_op.get_usage_of_fcps(['1111', '2222', 'xxxx'])
+            expected = [('1111', 'user1', 1, 2, template_id),
+                        ('2222', '', 0, 0, '')]
+            self.assertEqual(expected, sorted(result))
+        finally:
+            self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+
+    def test_get_connections_of_fcps(self):
+        """Test API get_connections_of_fcps"""
+        # pre create data in FCP DB for test
+        template_id = 'fakehost-1111-1111-1111-111111111111'
+        fcp_info_list = [('1111', '', 2, 1, 'c05076de33000111',
+                          'c05076de33002641', '27', '02e4', 'active', 'user1',
+                          template_id),
+                         ('2B22', '', 3, 1, 'c05076de33000222',
+                          'c05076de33002641', '27', '02e4', 'active', 'user1',
+                          '')]
+        fcp_id_list = [fcp_info[0] for fcp_info in fcp_info_list]
+        # delete dirty data from other test cases
+        self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+        # insert new test data
+        self._insert_data_into_fcp_table(fcp_info_list)
+        try:
+            self.assertEqual({}, self.db_op.get_connections_of_fcps([]))
+            # the keys are lower case even if the fcp_id is stored
+            # in upper case, FCP devices not found in DB are left out
+            result = self.db_op.get_connections_of_fcps(
+                ['1111', '2b22', 'xxxx'])
+            self.assertEqual({'1111': 2, '2b22': 3}, result)
+        finally:
+            self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+
+    def test_increase_connections_of_fcps(self):
+        """Test API increase_connections_of_fcps"""
+        # pre create data in FCP DB for test
+        template_id = 'fakehost-1111-1111-1111-111111111111'
+        fcp_info_list = [('1111', 'user1', 2, 1, 'c05076de33000111',
+                          'c05076de33002641', '27', '02e4', 'active', 'user1',
+                          template_id),
+                         ('2B22', 'user1', 0, 1, 'c05076de33000222',
+                          'c05076de33002641', '27', '02e4', 'active', 'user1',
+                          template_id)]
+        fcp_id_list = [fcp_info[0] for fcp_info in fcp_info_list]
+        # delete dirty data from other test cases
+        self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+        # insert new test data
+        self._insert_data_into_fcp_table(fcp_info_list)
+        try:
+            self.assertEqual(
+                {}, self.db_op.increase_connections_of_fcps([], 'user1'))
+            result = self.db_op.increase_connections_of_fcps(
+                ['1111', '2b22'], 'user1')
+            self.assertEqual({'1111': 3, '2b22': 1}, result)
+        finally:
+            self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+
+    def test_increase_connections_of_fcps_not_exist(self):
+        """Test API increase_connections_of_fcps with a missing FCP"""
+        # pre create data in FCP DB for test
+        template_id = 'fakehost-1111-1111-1111-111111111111'
+        fcp_info_list = [('1111', 'user1', 2, 1, 'c05076de33000111',
+                          'c05076de33002641', '27', '02e4', 'active', 'user1',
+                          template_id)]
+        fcp_id_list = [fcp_info[0] for fcp_info in fcp_info_list]
+        # delete dirty data from other test cases
+        self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+        # insert new test data
+        self._insert_data_into_fcp_table(fcp_info_list)
+        try:
+            # 'xxxx' does not exist in DB,
+            # 'xxxx' allocated to another assigner counts as missing, too
+            self.assertRaises(exception.SDKObjectNotExistError,
+                              self.db_op.increase_connections_of_fcps,
+                              ['1111', 'xxxx'], 'user1')
+            # the failure must leave the connections
+            # of the whole list untouched
+            self.assertEqual(2, self.db_op.get_connections_from_fcp('1111'))
+        finally:
+            self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+
     def test_get_all(self):
         pass
 
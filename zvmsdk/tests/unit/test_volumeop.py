@@ -18,7 +18,6 @@
 
 import mock
 from mock import call, Mock, patch
-import shutil
 import uuid
 
 from zvmsdk import config
@@ -115,6 +114,12 @@ class TestVolumeConfiguratorAPI(base.SDKTestCase):
         super(TestVolumeConfiguratorAPI, cls).setUpClass()
         cls.configurator = volumeop.VolumeConfiguratorAPI()
 
+    def setUp(self):
+        super(TestVolumeConfiguratorAPI, self).setUp()
+        # the configurator is shared by all the cases of this class,
+        # clean its per-os_version linuxdist cache to keep cases isolated
+        self.configurator._linux_dist_cache = {}
+
     @mock.patch("zvmsdk.smtclient.SMTClient.execute_cmd_direct")
     def test_get_status_code_from_systemctl(self, execute_cmd):
         line1 = ('(Error) ULTVMU0316E On CBM54008, command sent through IUCV '
@@ -249,11 +254,14 @@ class TestVolumeConfiguratorAPI(base.SDKTestCase):
                                             timeout=1800)
 
     @mock.patch("zvmsdk.dist.LinuxDistManager.get_linux_dist")
+    @mock.patch("zvmsdk.smtclient.SMTClient.execute_cmd_direct")
+    @mock.patch.object(dist.rhel7, "create_active_net_interf_cmd")
     @mock.patch("zvmsdk.volumeop.VolumeConfiguratorAPI."
                 "configure_volume_attach")
     @mock.patch("zvmsdk.volumeop.VolumeConfiguratorAPI.check_IUCV_is_ready")
     def test_config_attach_not_reachable(self, is_reachable, config_attach,
-                                         get_dist):
+                                         restart_zvmguestconfigure,
+                                         execute_cmd, get_dist):
         fcp = 'bfc3'
         assigner_id = 'userid1'
         target_wwpns = ['1111', '1112']
@@ -264,11 +272,19 @@ class TestVolumeConfiguratorAPI(base.SDKTestCase):
         is_reachable.return_value = False
         get_dist.return_value = dist.rhel7
         config_attach.return_value = None
+        # the restart of zvmguestconfigure fails because the VM is off,
+        # then the IUCV probe tells the failure can be ignored
+        execute_cmd.return_value = {'rc': 8}
+        active_cmds = 'systemctl start zvmguestconfigure.service'
+        restart_zvmguestconfigure.return_value = active_cmds
 
         self.configurator.config_attach(fcp, assigner_id, target_wwpns,
                                         target_lun, multipath, os_version,
                                         mount_point)
         get_dist.assert_called_once_with(os_version)
+        execute_cmd.assert_called_once_with(assigner_id, active_cmds,
+                                            timeout=1800)
+        is_reachable.assert_called_once_with(assigner_id)
 
     @mock.patch("zvmsdk.smtclient.SMTClient.execute_cmd")
     def test_check_IUCV_is_ready(self, execute_cmd):
@@ -314,12 +330,13 @@ class TestVolumeConfiguratorAPI(base.SDKTestCase):
         pass
 
     @mock.patch("zvmsdk.smtclient.SMTClient.punch_file")
-    @mock.patch.object(shutil, "rmtree")
+    @mock.patch("zvmsdk.volumeop.VolumeConfiguratorAPI._remove_config_file")
     @mock.patch("zvmsdk.volumeop.VolumeConfiguratorAPI._create_file")
     @mock.patch("zvmsdk.dist.LinuxDistManager.get_linux_dist")
     @mock.patch("zvmsdk.dist.rhel7.get_volume_attach_configuration_cmds")
     def test_config_attach_active(self, get_attach_cmds, get_dist,
-                                  create_file, rmtree, punch_file):
+                                  create_file, remove_config_file,
+                                  punch_file):
         fcp_list = ['1a11', '1b11']
         assigner_id = 'userid1'
         target_wwpns = ['1111', '1112']
@@ -332,7 +349,6 @@ class TestVolumeConfiguratorAPI(base.SDKTestCase):
         linuxdist = dist.rhel7()
         get_dist.return_value = linuxdist
         create_file.return_value = (config_file, config_file_path)
-        rmtree.return_value = None
         self.configurator.configure_volume_attach(fcp_list, assigner_id,
                                                   target_wwpns, target_lun,
                                                   multipath, os_version,
@@ -342,14 +358,17 @@ class TestVolumeConfiguratorAPI(base.SDKTestCase):
                                                 target_lun, multipath,
                                                 mount_point)
         punch_file.assert_called_once_with(assigner_id, config_file, 'X')
+        remove_config_file.assert_called_once_with(config_file,
+                                                   config_file_path)
 
     @mock.patch("zvmsdk.smtclient.SMTClient.punch_file")
-    @mock.patch.object(shutil, "rmtree")
+    @mock.patch("zvmsdk.volumeop.VolumeConfiguratorAPI._remove_config_file")
     @mock.patch("zvmsdk.volumeop.VolumeConfiguratorAPI._create_file")
     @mock.patch("zvmsdk.dist.LinuxDistManager.get_linux_dist")
     @mock.patch("zvmsdk.dist.rhel7.get_volume_detach_configuration_cmds")
     def test_config_detach_active(self, get_detach_cmds, get_dist,
-                                  create_file, rmtree, punch_file):
+                                  create_file, remove_config_file,
+                                  punch_file):
         fcp_list = ['1a11', '1b11']
         assigner_id = 'userid1'
         target_wwpns = ['1111', '1112']
@@ -363,7 +382,6 @@ class TestVolumeConfiguratorAPI(base.SDKTestCase):
         linuxdist = dist.rhel7()
         get_dist.return_value = linuxdist
         create_file.return_value = (config_file, config_file_path)
-        rmtree.return_value = None
         self.configurator.configure_volume_detach(fcp_list, assigner_id,
                                                   target_wwpns, target_lun,
                                                   multipath, os_version,
@@ -374,6 +392,8 @@ class TestVolumeConfiguratorAPI(base.SDKTestCase):
                                                 target_lun, multipath,
                                                 mount_point, connections)
         punch_file.assert_called_once_with(assigner_id, config_file, 'X')
+        remove_config_file.assert_called_once_with(config_file,
+                                                   config_file_path)
 
 
 class TestFCP(base.SDKTestCase):
@@ -1803,15 +1823,16 @@ class TestFCPManager(base.SDKTestCase):
         self.fcpops.delete_fcp_template('tmpl_id')
         mock_db_delete_tmpl.assert_called_once_with('tmpl_id')
 
-    @mock.patch("zvmsdk.database.FCPDbOperator.increase_connections_by_assigner")
+    @mock.patch("zvmsdk.database.FCPDbOperator.increase_connections_of_fcps")
     def test_increase_fcp_connections(self, mock_increase_conn):
         """Test increase_fcp_connections"""
         _purge_fcp_db()
-        mock_increase_conn.side_effect = [1, 2, 0]
+        expect = {'1a01': 1, '1b01': 2, '1c01': 0}
+        mock_increase_conn.return_value = expect
         fcp_list = ['1a01', '1b01', '1c01']
         assigner_id = 'fake_id'
-        expect = {'1a01': 1, '1b01': 2, '1c01': 0}
         result = self.fcpops.increase_fcp_connections(fcp_list, assigner_id)
+        mock_increase_conn.assert_called_once_with(fcp_list, assigner_id)
         self.assertDictEqual(result, expect)
 
     @mock.patch("zvmsdk.database.FCPDbOperator.decrease_connections")
@@ -2201,11 +2222,11 @@ class TestFCPVolumeManager(base.SDKTestCase):
             self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
             self.db_op.bulk_delete_fcp_from_template(fcp_id_list, template_id)
 
-    @mock.patch("zvmsdk.volumeop.FCPVolumeManager.get_fcp_usage")
+    @mock.patch("zvmsdk.database.FCPDbOperator.get_usage_of_fcps")
     @mock.patch("zvmsdk.utils.check_userid_exist")
     @mock.patch("zvmsdk.volumeop.FCPVolumeManager._do_attach")
     def test_attach_with_exception(self, mock_do_attach, mock_check_userid,
-                                   mock_get_fcp_usage):
+                                   mock_get_usage_of_fcps):
         """Test attach() method when _do_attach() raise exception."""
         _purge_fcp_db()
         connection_info = {'platform': 'x86_64',
@@ -2220,14 +2241,15 @@ class TestFCPVolumeManager(base.SDKTestCase):
                            'fcp_template_id': 'BOEM5401-1111-1111-1111-111111111111'}
         # case1: enter except-block
         mock_check_userid.return_value = True
-        mock_get_fcp_usage.side_effect = (Exception(), ('user1', 1, 1, 'fake_tmpl_id'))
+        # the usage query for logging is best-effort,
+        # an exception from it must not mask the original error
+        mock_get_usage_of_fcps.side_effect = Exception()
         mock_do_attach.side_effect = exception.SDKSMTRequestFailed({}, 'fake_msg')
         self.assertRaises(exception.SDKSMTRequestFailed,
                           self.volumeops.attach,
                           connection_info)
         mock_do_attach.assert_called_once()
-        self.assertEqual(mock_get_fcp_usage.call_args_list,
-                         [call('e83c'), call('d83c')])
+        mock_get_usage_of_fcps.assert_called_once_with(['e83c', 'd83c'])
 
     @mock.patch("zvmsdk.volumeop.FCPManager._get_all_fcp_info")
     @mock.patch("zvmsdk.volumeop.FCPVolumeManager._add_disks")
@@ -3056,13 +3078,14 @@ class TestFCPVolumeManager(base.SDKTestCase):
             self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
 
     @mock.patch("zvmsdk.database.FCPDbOperator.unreserve_fcps")
-    @mock.patch("zvmsdk.database.FCPDbOperator.get_connections_from_fcp")
-    @mock.patch("zvmsdk.volumeop.FCPVolumeManager.get_fcp_usage")
-    def test_rollback_reserved_fcp_devices(self, get_fcp_usage, mock_get_conn, mock_unreserve):
+    @mock.patch("zvmsdk.database.FCPDbOperator.get_connections_of_fcps")
+    @mock.patch("zvmsdk.database.FCPDbOperator.get_usage_of_fcps")
+    def test_rollback_reserved_fcp_devices(self, get_usage_of_fcps, mock_get_conn, mock_unreserve):
         """Test _rollback_reserved_fcp_devices."""
         _purge_fcp_db()
-        get_fcp_usage.return_value = None
-        mock_get_conn.side_effect = [1, 0, 0, 0]
+        get_usage_of_fcps.return_value = []
+        mock_get_conn.return_value = {'1a01': 1, '1b01': 0,
+                                      '1c01': 0, '1d01': 0}
         fcp_list = ['1a01', '1b01', '1c01', '1d01']
         self.volumeops._rollback_reserved_fcp_devices(fcp_list)
         mock_unreserve.assert_called_once_with(fcp_list[1:])
@@ -3079,11 +3102,12 @@ class TestFCPVolumeManager(base.SDKTestCase):
                                               mock.call('1c01'), mock.call('1d01')])
 
     @mock.patch("zvmsdk.volumeop.FCPVolumeManager._undedicate_fcp")
-    @mock.patch("zvmsdk.database.FCPDbOperator.get_connections_from_fcp")
+    @mock.patch("zvmsdk.database.FCPDbOperator.get_connections_of_fcps")
     def test_rollback_dedicated_fcp_devices(self, mock_get_conn, mock_undedicate):
         """Test _rollback_dedicated_fcp_devices()."""
         _purge_fcp_db()
-        mock_get_conn.side_effect = [1, 0, 1, 0]
+        mock_get_conn.return_value = {'1a01': 1, '1b01': 0,
+                                      '1c01': 1, '1d01': 0}
         fcp_list = ['1a01', '1b01', '1c01', '1d01']
         assigner_id = 'fake_id'
         self.volumeops._rollback_dedicated_fcp_devices(fcp_list, assigner_id)
@@ -3091,11 +3115,12 @@ class TestFCPVolumeManager(base.SDKTestCase):
         self.assertEqual(mock_undedicate.call_args_list, expected_calls_in_order)
 
     @mock.patch("zvmsdk.volumeop.FCPVolumeManager._remove_disks")
-    @mock.patch("zvmsdk.database.FCPDbOperator.get_connections_from_fcp")
+    @mock.patch("zvmsdk.database.FCPDbOperator.get_connections_of_fcps")
     def test_rollback_added_disks(self, mock_get_conn, mock_rm_disk):
         """Test _rollback_added_disks()."""
         _purge_fcp_db()
-        mock_get_conn.side_effect = [1, 0, 0, 0]
+        mock_get_conn.return_value = {'1a01': 1, '1b01': 0,
+                                      '1c01': 0, '1d01': 0}
         fcp_list = ['1a01', '1b01', '1c01', '1d01']
         assigner_id = 'fake_id'
         target_wwpns = 'tgt_wwpn'
@@ -826,16 +826,28 @@ def is_chpid_virtualization_enabled():
         raise exception.SDKInternalError(msg=msg)
 
 
+# cache the CHPID to PCHID mapping queried by get_pchid,
+# the mapping is fixed on a host unless its I/O configuration is changed
+_PCHID_CACHE = {}
+
+
 def get_pchid(chpid):
     """Get pchid of FCP device from its chpid
 
+    The result is cached, because resolving a chpid spawns one or two
+    subprocesses (vmcp/lschp) and get_pchid is called once per FCP device
+    when parsing the smcli output.
+
     :param chpid: Channel path ID of FCP device, for example: 10
     :return pchid: Physical channel ID of FCP device, for example: 0240
     """
-    if is_chpid_virtualization_enabled():
-        pchid = get_pchid_by_vmcp_query(chpid)
-    else:
-        pchid = get_pchid_by_lschp(chpid)
+    pchid = _PCHID_CACHE.get(chpid)
+    if pchid is None:
+        if is_chpid_virtualization_enabled():
+            pchid = get_pchid_by_vmcp_query(chpid)
+        else:
+            pchid = get_pchid_by_lschp(chpid)
+        _PCHID_CACHE[chpid] = pchid
     return pchid
 
 
@@ -963,6 +975,17 @@ def print_all_pchids():
         raise exception.SDKInternalError(msg=msg)
 
 
+# patterns used by expand_fcp_list to validate a FCP list string,
+# compiled once at import time to avoid rebuilding them on every call
+_FCP_RANGE_PATTERN = '[0-9a-fA-F]{1,4}(-[0-9a-fA-F]{1,4})?'
+_FCP_ITEM_PATTERN = "(%(range)s)(,%(range)s?)*" % \
+                    {'range': _FCP_RANGE_PATTERN}
+_FCP_MATCH_RE = re.compile("^(%(range)s)(;%(range)s;?)*$" %
+                           {'range': _FCP_RANGE_PATTERN})
+_FCP_MULTI_MATCH_RE = re.compile("^(%(range)s)(;%(range)s;?)*$" %
+                                 {'range': _FCP_ITEM_PATTERN})
+
+
 def expand_fcp_list(fcp_list):
     """Expand fcp list string into a python list object which contains
     each fcp devices in the list string. A fcp list is composed of fcp
@@ -996,18 +1019,9 @@ def expand_fcp_list(fcp_list):
         return dict()
     fcp_list = fcp_list.strip()
     fcp_list = fcp_list.replace(' ', '')
-    range_pattern = '[0-9a-fA-F]{1,4}(-[0-9a-fA-F]{1,4})?'
-    match_pattern = "^(%(range)s)(;%(range)s;?)*$" % \
-                    {'range': range_pattern}
-
-    item_pattern = "(%(range)s)(,%(range)s?)*" % \
-                   {'range': range_pattern}
-
-    multi_match_pattern = "^(%(range)s)(;%(range)s;?)*$" % \
-                   {'range': item_pattern}
 
-    if not re.match(match_pattern, fcp_list) and \
-       not re.match(multi_match_pattern, fcp_list):
+    if not _FCP_MATCH_RE.match(fcp_list) and \
+       not _FCP_MULTI_MATCH_RE.match(fcp_list):
         errmsg = ("Invalid FCP address %s") % fcp_list
         raise exception.SDKInternalError(msg=errmsg)
 
@@ -1021,14 +1035,14 @@ def expand_fcp_list(fcp_list):
                 if '-' not in item:
                     # single device
                     fcp_addr = int(item, 16)
-                    devices.add("%04x" % fcp_addr)
+                    devices.add(format(fcp_addr, '04x'))
                 else:
                     # a range of address
                     (_min, _max) = item.split('-')
                     _min = int(_min, 16)
                     _max = int(_max, 16)
-                    for fcp_addr in range(_min, _max + 1):
-                        devices.add("%04x" % fcp_addr)
+                    devices.update(format(fcp_addr, '04x')
+                                   for fcp_addr in range(_min, _max + 1))
                 if fcp_devices.get(path_no):
                     fcp_devices[path_no].update(devices)
                 else:
@@ -17,13 +17,15 @@
 
 
 import abc
+import itertools
 import re
-import shutil
 import uuid
 import six
 import threading
 import os
 
+from concurrent import futures
+
 from zvmsdk import config
 from zvmsdk import constants
 from zvmsdk import database
@@ -35,11 +37,41 @@ from zvmsdk import utils as zvmutils
 from zvmsdk import vmops
 from zvmsdk import utils
 
+try:
+    # optional accelerator: a C implementation of RLock with a cheaper
+    # uncontended acquire path, used when the package is installed
+    from fastrlock.rlock import FastRLock as _RLock
+except ImportError:
+    _RLock = threading.RLock
+
 
 _VolumeOP = None
 CONF = config.CONF
 LOG = log.LOG
 
+# pattern to match the status code in systemctl status output,
+# e.g. the 0 in 'Main PID: 28406 (code=exited, status=0/SUCCESS)'
+_STATUS_RE = re.compile(r'(?<=status=)([0-9]+)')
+
+# labels of the property lines in the FCP info block returned by smcli,
+# matched with one compiled regex per line instead of testing every
+# label with a chain of substring scans;
+# 'Physical world wide port numbe' is kept truncated on purpose to
+# tolerate the spelling used by some hypervisor levels
+_FCP_INFO_LINE_RE = re.compile(
+    r'(FCP device number|Status|NPIV world wide port number|'
+    r'Channel path ID|Physical world wide port numbe|Owner)')
+# map the matched label to the attribute of the FCP object to be set
+_FCP_INFO_ATTR_MAP = {
+    'FCP device number': '_dev_no',
+    'Status': '_dev_status',
+    'NPIV world wide port number': '_npiv_port',
+    'Channel path ID': '_chpid',
+    'Physical world wide port numbe': '_physical_port',
+    'Owner': '_owner',
+}
+
+
 # instance parameters:
 NAME = 'name'
 OS_TYPE = 'os_type'
@@ -55,10 +87,19 @@ WWPNS = 'wwpns'
 DEDICATE = 'dedicate'
 
 
+# protect the one-time construction of the VolumeOperatorAPI singleton:
+# without the lock, concurrent SDK driver threads entering get_volumeop()
+# for the first time could each build a FCPVolumeManager (and sync the
+# FCP DB) before _VolumeOP is assigned
+_VolumeOP_LOCK = threading.Lock()
+
+
 def get_volumeop():
     global _VolumeOP
     if not _VolumeOP:
-        _VolumeOP = VolumeOperatorAPI()
+        with _VolumeOP_LOCK:
+            if not _VolumeOP:
+                _VolumeOP = VolumeOperatorAPI()
     return _VolumeOP
 
 
@@ -80,10 +121,14 @@ class VolumeOperatorAPI(object):
     """
 
     _fcp_manager_obj = None
+    # serialize the one-time construction of the shared FCPVolumeManager
+    _fcp_manager_lock = threading.Lock()
 
     def __init__(self):
         if not VolumeOperatorAPI._fcp_manager_obj:
-            VolumeOperatorAPI._fcp_manager_obj = FCPVolumeManager()
+            with VolumeOperatorAPI._fcp_manager_lock:
+                if not VolumeOperatorAPI._fcp_manager_obj:
+                    VolumeOperatorAPI._fcp_manager_obj = FCPVolumeManager()
         self._volume_manager = VolumeOperatorAPI._fcp_manager_obj
 
     def attach_volume_to_instance(self, connection_info):
@@ -165,6 +210,17 @@ class VolumeConfiguratorAPI(object):
         self._vmop = vmops.get_vmops()
         self._dist_manager = dist.LinuxDistManager()
         self._smtclient = smtclient.get_smtclient()
+        # cache the instantiated linuxdist object per os_version,
+        # so that bulk attach/detach across guests sharing the same OS
+        # does not redo the distro lookup and instantiation each call
+        self._linux_dist_cache = {}
+
+    def _get_linux_dist(self, os_version):
+        linuxdist = self._linux_dist_cache.get(os_version)
+        if linuxdist is None:
+            linuxdist = self._dist_manager.get_linux_dist(os_version)()
+            self._linux_dist_cache[os_version] = linuxdist
+        return linuxdist
 
     def check_IUCV_is_ready(self, assigner_id):
         # Make sure the iucv channel is ready for communication with VM
@@ -200,35 +256,46 @@ class VolumeConfiguratorAPI(object):
         this function will return the 3 behind status=
         """
         output = self._smtclient.execute_cmd_direct(assigner_id, command)
-        exit_code = 0
+        # the status code starts with = and is before /FAILURE;
+        # return on the first 'Main PID' line carrying a status,
+        # default to 0 if no such line is found
         for line in output['response']:
             if 'Main PID' in line:
-                # the status code start with = and before /FAILURE
-                pattern = '(?<=status=)([0-9]+)'
-                ret = re.search(pattern, line)
-                exit_code = int(ret.group(1))
-                break
-        return exit_code
+                found = _STATUS_RE.search(line)
+                if found:
+                    return int(found.group(1))
+        return 0
 
     def config_attach(self, fcp_list, assigner_id, target_wwpns, target_lun,
                       multipath, os_version, mount_point):
         LOG.info("Begin to configure volume (WWPN:%s, LUN:%s) on the "
                  "virtual machine %s with FCP devices "
                  "%s." % (target_wwpns, target_lun, assigner_id, fcp_list))
-        linuxdist = self._dist_manager.get_linux_dist(os_version)()
+        linuxdist = self._get_linux_dist(os_version)
         self.configure_volume_attach(fcp_list, assigner_id, target_wwpns,
                                      target_lun, multipath, os_version,
                                      mount_point, linuxdist)
-        iucv_is_ready = self.check_IUCV_is_ready(assigner_id)
-        if iucv_is_ready:
-            # If VM is active rather than shutdown, then restart zvmguestconfigure
-            # to run punch script(i.e. reader file) in the VM operating system
-            active_cmds = linuxdist.create_active_net_interf_cmd()
-            ret = self._smtclient.execute_cmd_direct(
-                assigner_id, active_cmds,
-                timeout=CONF.volume.punch_script_execution_timeout)
-            LOG.info('attach scripts return values: %s' % ret)
-            if ret['rc'] != 0:
+        # Restart zvmguestconfigure to run the punch script
+        # (i.e. reader file) in the VM operating system.
+        # The IUCV channel is probed only when the restart fails, so the
+        # common active-VM case costs a single SMT round-trip instead of
+        # a 'pwd' probe followed by the restart.
+        active_cmds = linuxdist.create_active_net_interf_cmd()
+        ret = self._smtclient.execute_cmd_direct(
+            assigner_id, active_cmds,
+            timeout=CONF.volume.punch_script_execution_timeout)
+        LOG.info('attach scripts return values: %s' % ret)
+        if ret['rc'] != 0:
+            # check_IUCV_is_ready() raises if the VM refuses IUCV
+            # authorization; when the VM is simply unreachable, assume
+            # it is in OFF status and leave the punched script to run
+            # at next boot
+            if not self.check_IUCV_is_ready(assigner_id):
+                LOG.info("The virtual machine %s is not reachable via "
+                         "IUCV, assume it is in OFF status and the "
+                         "punched script will run when it starts up."
+                         % assigner_id)
+            else:
                 # if return code is 64 means timeout
                 # no need to check the exist code of systemctl and return
                 if ret['rc'] == 64:
@@ -296,20 +363,31 @@ class VolumeConfiguratorAPI(object):
         LOG.info("Begin to deconfigure volume (WWPN:%s, LUN:%s) on the "
                  "virtual machine %s with FCP devices "
                  "%s." % (target_wwpns, target_lun, assigner_id, fcp_list))
-        linuxdist = self._dist_manager.get_linux_dist(os_version)()
+        linuxdist = self._get_linux_dist(os_version)
         self.configure_volume_detach(fcp_list, assigner_id, target_wwpns,
                                      target_lun, multipath, os_version,
                                      mount_point, linuxdist, connections)
-        iucv_is_ready = self.check_IUCV_is_ready(assigner_id)
-        if iucv_is_ready:
-            # If VM is active rather than shutdown, then restart zvmguestconfigure
-            # to run punch script(i.e. reader file) in the VM operating system
-            active_cmds = linuxdist.create_active_net_interf_cmd()
-            ret = self._smtclient.execute_cmd_direct(
-                assigner_id, active_cmds,
-                timeout=CONF.volume.punch_script_execution_timeout)
-            LOG.info('detach scripts return values: %s' % ret)
-            if ret['rc'] != 0:
+        # Restart zvmguestconfigure to run the punch script
+        # (i.e. reader file) in the VM operating system.
+        # The IUCV channel is probed only when the restart fails, so the
+        # common active-VM case costs a single SMT round-trip instead of
+        # a 'pwd' probe followed by the restart.
+        active_cmds = linuxdist.create_active_net_interf_cmd()
+        ret = self._smtclient.execute_cmd_direct(
+            assigner_id, active_cmds,
+            timeout=CONF.volume.punch_script_execution_timeout)
+        LOG.info('detach scripts return values: %s' % ret)
+        if ret['rc'] != 0:
+            # check_IUCV_is_ready() raises if the VM refuses IUCV
+            # authorization; when the VM is simply unreachable, assume
+            # it is in OFF status and leave the punched script to run
+            # at next boot
+            if not self.check_IUCV_is_ready(assigner_id):
+                LOG.info("The virtual machine %s is not reachable via "
+                         "IUCV, assume it is in OFF status and the "
+                         "punched script will run when it starts up."
+                         % assigner_id)
+            else:
                 # if return code is 64 means timeout
                 # no need to check the exist code of systemctl and return
                 if ret['rc'] == 64:
@@ -362,11 +440,33 @@ class VolumeConfiguratorAPI(object):
                  "%s is done." % (target_wwpns, target_lun, assigner_id,
                                   fcp_list))
 
+    @staticmethod
+    def _remove_config_file(config_file, config_file_path):
+        """Remove the punched script file and its temp folder.
+
+        The folder returned by _create_file contains exactly the one
+        script file, so remove them directly instead of paying for the
+        directory walk done by shutil.rmtree.
+        """
+        try:
+            os.unlink(config_file)
+        except OSError:
+            # punch_file() removes the script file once it is punched,
+            # so normally the file is gone already
+            pass
+        os.rmdir(config_file_path)
+
     def _create_file(self, assigner_id, file_name, data):
         temp_folder = self._smtclient.get_guest_temp_path(assigner_id)
         file_path = os.path.join(temp_folder, file_name)
-        with open(file_path, "w") as f:
-            f.write(data)
+        # write the script with one open/write/close syscall triple
+        # instead of going through the buffered file object layer,
+        # because punch_file() only needs the file to exist on disk
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, data.encode('utf-8'))
+        finally:
+            os.close(fd)
         return file_path, temp_folder
 
     def configure_volume_attach(self, fcp_list, assigner_id, target_wwpns,
@@ -394,7 +494,7 @@ class VolumeConfiguratorAPI(object):
             self._smtclient.punch_file(assigner_id, config_file, fileClass)
         finally:
             LOG.debug('Removing the folder %s ', config_file_path)
-            shutil.rmtree(config_file_path)
+            self._remove_config_file(config_file, config_file_path)
 
     def configure_volume_detach(self, fcp_list, assigner_id, target_wwpns,
                                 target_lun, multipath, os_version,
@@ -420,10 +520,16 @@ class VolumeConfiguratorAPI(object):
             self._smtclient.punch_file(assigner_id, config_file, fileClass)
         finally:
             LOG.debug('Removing the folder %s ', config_file_path)
-            shutil.rmtree(config_file_path)
+            self._remove_config_file(config_file, config_file_path)
 
 
 class FCP(object):
+    # a FCP object is created per FCP device on every sync with z/VM,
+    # so for hosts with large fcp_lists declare the fixed attribute set
+    # to avoid allocating a per-instance __dict__
+    __slots__ = ('_dev_no', '_dev_status', '_npiv_port', '_chpid',
+                 '_pchid', '_physical_port', '_assigned_id', '_owner')
+
     def __init__(self, init_info):
         self._dev_no = None
         self._dev_status = None
@@ -459,26 +565,19 @@ class FCP(object):
         lines_per_item = constants.FCP_INFO_LINES_PER_ITEM
         if isinstance(init_info, list) and (len(init_info) == lines_per_item):
             for line in init_info:
-                if 'FCP device number' in line:
-                    self._dev_no = self._get_value_from_line(line)
-                elif 'Status' in line:
-                    self._dev_status = self._get_value_from_line(line)
-                elif 'NPIV world wide port number' in line:
-                    self._npiv_port = self._get_value_from_line(line)
-                elif 'Channel path ID' in line:
-                    self._chpid = self._get_value_from_line(line)
+                label = _FCP_INFO_LINE_RE.search(line)
+                if label is None:
+                    LOG.info('Unknown line found in FCP information:%s', line)
+                    continue
+                setattr(self, _FCP_INFO_ATTR_MAP[label.group(1)],
+                        self._get_value_from_line(line))
+                if label.group(1) == 'Channel path ID':
                     if len(self._chpid) != 2:
                         LOG.warn("CHPID value %s of FCP device %s is "
                                  "invalid!" % (self._chpid, self._dev_no))
                     else:
                         # get pchid from linux command lschp
                         self._pchid = zvmutils.get_pchid(self._chpid)
-                elif 'Physical world wide port numbe' in line:
-                    self._physical_port = self._get_value_from_line(line)
-                elif 'Owner' in line:
-                    self._owner = self._get_value_from_line(line)
-                else:
-                    LOG.info('Unknown line found in FCP information:%s', line)
         else:
             LOG.warning('When parsing FCP information, got an invalid '
                         'instance %s', init_info)
@@ -548,6 +647,20 @@ class FCPManager(object):
 
         return fcp_info
 
+    def _iter_all_fcp_info(self, assigner_id, status=None):
+        """Iterate the FCP info lines queried from z/VM in chunks of
+        FCP_INFO_LINES_PER_ITEM lines, one chunk per FCP device,
+        without materializing the chunks up front;
+        a trailing partial chunk (if any) is dropped
+        """
+        lines_per_item = constants.FCP_INFO_LINES_PER_ITEM
+        lines = iter(self._get_all_fcp_info(assigner_id, status))
+        while True:
+            chunk = list(itertools.islice(lines, lines_per_item))
+            if len(chunk) < lines_per_item:
+                return
+            yield chunk
+
     def increase_fcp_connections(self, fcp_list, assigner_id=None):
         """Increase connections of the given FCP devices
 
@@ -557,12 +670,9 @@ class FCPManager(object):
             fcp_connections example {'1a10': 1, '1b10', 0}
             the values are the connections of the FCP device
         """
-        with database.get_fcp_conn():
-            fcp_connections = {}
-            for fcp in fcp_list:
-                # increase connections by 1
-                fcp_connections[fcp] = self.db.increase_connections_by_assigner(fcp, assigner_id)
-            return fcp_connections
+        # increase the connections of the whole list by 1
+        # in one transaction
+        return self.db.increase_connections_of_fcps(fcp_list, assigner_id)
 
     def decrease_fcp_connections(self, fcp_list):
         """Decrease connections of FCP devices by 1
@@ -863,18 +973,9 @@ class FCPManager(object):
             '1b07': <zvmsdk.volumeop.FCP object at 0x3ff94f74710>
         }
         """
-        all_fcp_info = self._get_all_fcp_info(assigner_id)
-        lines_per_item = constants.FCP_INFO_LINES_PER_ITEM
-        all_fcp_pool = {}
-        num_fcps = len(all_fcp_info) // lines_per_item
-        for n in range(0, num_fcps):
-            start_line = lines_per_item * n
-            end_line = lines_per_item * (n + 1)
-            fcp_init_info = all_fcp_info[start_line:end_line]
-            fcp = FCP(fcp_init_info)
-            dev_no = fcp.get_dev_no()
-            all_fcp_pool[dev_no] = fcp
-        return all_fcp_pool
+        return {fcp.get_dev_no(): fcp
+                for fcp in (FCP(chunk) for chunk
+                            in self._iter_all_fcp_info(assigner_id))}
 
     def get_fcp_dict_in_db(self):
         """Return a dict of all FCPs in FCP_DB
@@ -1231,16 +1332,13 @@ class FCPManager(object):
         (fcp_id, template_id, path_id, assigner_id, connections,
          reserved, wwpn_npiv, wwpn_phy, chpid, pchid, state, owner,
          tmpl_id) = raw_item
-        if not raw_usage.get(template_id, None):
-            raw_usage[template_id] = {}
-        if not raw_usage[template_id].get(path_id, None):
-            raw_usage[template_id][path_id] = []
         # remove path_id from raw data, keep the last templ_id to
         # represent from which template this FCP has been allocated out.
         return_raw = (fcp_id, template_id, assigner_id, connections,
                       reserved, wwpn_npiv, wwpn_phy, chpid, pchid, state,
                       owner, tmpl_id)
-        raw_usage[template_id][path_id].append(return_raw)
+        raw_usage.setdefault(template_id, {}).setdefault(
+            path_id, []).append(return_raw)
         return raw_usage
 
     def extract_template_info_from_raw_data(self, raw_data):
@@ -1323,9 +1421,9 @@ class FCPManager(object):
         # so construct a dict statistics_usage[template_id]
         # with template_id as key to group the info.
         # template_id key also will be used to join with template base info
-        if not statistics_usage.get(template_id, None):
+        if template_id not in statistics_usage:
             statistics_usage[template_id] = {}
-        if not statistics_usage[template_id].get(path_id, None):
+        if path_id not in statistics_usage[template_id]:
             statistics_usage[template_id][path_id] = {
                 "total": [],
                 "total_count": {},
@@ -1432,14 +1530,11 @@ class FCPManager(object):
                                 "differs from owner." % str(fcp_id))
             if chpid:
                 chpid = chpid.upper()
-                if not statistics_usage[template_id][path_id]["chpids"].get(chpid, None):
-                    statistics_usage[
-                        template_id][path_id]["chpids"].update({chpid: []})
-                statistics_usage[
-                    template_id][path_id]["chpids"][chpid].append(fcp_id)
+                statistics_usage[template_id][path_id]["chpids"].setdefault(
+                    chpid, []).append(fcp_id)
             if pchid:
                 pchid = pchid.upper()
-                if not statistics_usage[template_id][path_id]["pchids"].get(pchid, None):
+                if pchid not in statistics_usage[template_id][path_id]["pchids"]:
                     statistics_usage[
                         template_id][path_id]["pchids"].update({pchid: ''})
                     statistics_usage[
@@ -1873,9 +1968,15 @@ class FCPManager(object):
         #         "storage_providers": [sp_name]
         #     }
         # }
-        if raw:
-            for item in devices_result:
+        # accumulate raw and statistics usage in a single pass
+        # over the device rows
+        for item in devices_result:
+            if raw:
                 self._update_template_fcp_raw_usage(raw_usage, item)
+            if statistics:
+                self._update_template_fcp_statistics_usage(
+                    statistics_usage, item)
+        if raw:
             for template_id, base_info in template_info.items():
                 if template_id in raw_usage:
                     base_info.update({"raw": raw_usage[template_id]})
@@ -1899,9 +2000,6 @@ class FCPManager(object):
             # }
         # get fcp statistics usage
         if statistics:
-            for item in devices_result:
-                self._update_template_fcp_statistics_usage(
-                    statistics_usage, item)
             LOG.info("statistic FCP usage before shrink: %s"
                      % statistics_usage)
             self._shrink_fcp_list_in_statistics_usage(statistics_usage)
@@ -1989,7 +2087,7 @@ class FCPVolumeManager(object):
         self.fcp_mgr = FCPManager()
         self.config_api = VolumeConfiguratorAPI()
         self._smtclient = smtclient.get_smtclient()
-        self._lock = threading.RLock()
+        self._lock = _RLock()
         # previously FCPDbOperator is initialized twice, here we
         # just do following variable redirection to avoid too much
         # reference code changes
@@ -2015,11 +2113,10 @@ class FCPVolumeManager(object):
         """
         LOG.info("Enter rollback function: _rollback_reserved_fcp_devices.")
         # Before rollback, print information for debug
-        fcp_usage = [self.get_fcp_usage(fcp) for fcp in fcp_list]
-        LOG.info("Before rollback, the usage of the FCP devices is: %s" % fcp_usage)
+        fcp_usage = self.db.get_usage_of_fcps(fcp_list)
+        LOG.info("Before rollback, the usage of the FCP devices is: %s", fcp_usage)
         # Get the connections status in FCP DB
-        fcp_connections = {fcp: self.db.get_connections_from_fcp(fcp)
-                           for fcp in fcp_list}
+        fcp_connections = self.db.get_connections_of_fcps(fcp_list)
         # Operation on FCP DB:
         # if connections is 0,
         # then unreserve the FCP device and cleanup tmpl_id
@@ -2030,8 +2127,8 @@ class FCPVolumeManager(object):
                 self.db.unreserve_fcps(no_connection_fcps)
                 LOG.info("Rollback on FCP DB: Unreserve FCP devices %s", no_connection_fcps)
         # After rollback, print information for debug
-        fcp_usage = [self.get_fcp_usage(fcp) for fcp in fcp_list]
-        LOG.info("After rollback, the usage of the FCP devices is: %s" % fcp_usage)
+        fcp_usage = self.db.get_usage_of_fcps(fcp_list)
+        LOG.info("After rollback, the usage of the FCP devices is: %s", fcp_usage)
         LOG.info("Exit rollback function: _rollback_reserved_fcp_devices.")
 
     def _rollback_increased_connections(self, fcp_list):
@@ -2045,14 +2142,14 @@ class FCPVolumeManager(object):
         """
         LOG.info("Enter rollback function: _rollback_increased_connections")
         # Before rollback, print information for debug
-        fcp_usage = [self.get_fcp_usage(fcp) for fcp in fcp_list]
-        LOG.info("Before rollback, the usage of the FCP devices is: %s" % fcp_usage)
+        fcp_usage = self.db.get_usage_of_fcps(fcp_list)
+        LOG.info("Before rollback, the usage of the FCP devices is: %s", fcp_usage)
         for fcp in fcp_list:
             with zvmutils.ignore_errors():
                 self.db.decrease_connections(fcp)
         # After rollback, print information for debug
-        fcp_usage = [self.get_fcp_usage(fcp) for fcp in fcp_list]
-        LOG.info("After rollback, the usage of the FCP devices is: %s" % fcp_usage)
+        fcp_usage = self.db.get_usage_of_fcps(fcp_list)
+        LOG.info("After rollback, the usage of the FCP devices is: %s", fcp_usage)
         LOG.info("Exit rollback function: _rollback_increased_connections")
 
     def _rollback_dedicated_fcp_devices(self, fcp_list, assigner_id):
@@ -2067,19 +2164,18 @@ class FCPVolumeManager(object):
         """
         LOG.info("Enter rollback function: _rollback_dedicated_fcp_devices")
         # Get the connections status in FCP DB
-        fcp_connections = {fcp: self.db.get_connections_from_fcp(fcp)
-                           for fcp in fcp_list}
+        fcp_connections = self.db.get_connections_of_fcps(fcp_list)
         # Operation on z/VM:
         # undedicate FCP device from assigner_id
         for fcp in fcp_list:
             with zvmutils.ignore_errors():
                 if fcp_connections[fcp] == 1:
                     self._undedicate_fcp(fcp, assigner_id)
-                    LOG.info("Rollback on z/VM: undedicate FCP device {}, "
-                             "because its connections is 1".format(fcp))
+                    LOG.info("Rollback on z/VM: undedicate FCP device %s, "
+                             "because its connections is 1", fcp)
                 else:
-                    LOG.info("Skip undedicate FCP device {},"
-                             "because its connections is greater than 1".format(fcp))
+                    LOG.info("Skip undedicate FCP device %s,"
+                             "because its connections is greater than 1", fcp)
         LOG.info("Exit rollback function: _rollback_dedicated_fcp_devices")
 
     def _rollback_added_disks(self, fcp_list, assigner_id, target_wwpns, target_lun,
@@ -2095,8 +2191,7 @@ class FCPVolumeManager(object):
         """
         LOG.info("Enter rollback function: _rollback_added_disks")
         # Operation on VM OS: offline volume and FCP devices from VM OS
-        fcp_connections = {fcp: self.db.get_connections_from_fcp(fcp)
-                           for fcp in fcp_list}
+        fcp_connections = self.db.get_connections_of_fcps(fcp_list)
         with zvmutils.ignore_errors():
             # _remove_disks() offline FCP devices only when total_connections is 0,
             # i.e. detaching the last volume from the FCP devices
@@ -2122,7 +2217,7 @@ class FCPVolumeManager(object):
         call smt layer to configure volume in the target VM.
         """
         LOG.info("Start to attach volume to FCP devices "
-                 "%s on machine %s." % (fcp_list, assigner_id))
+                 "%s on machine %s.", fcp_list, assigner_id)
         try:
             # Operation on FCP DB:
             # 1. Although the fcp devices in fcp_list were already reserved by get_volume_connector,
@@ -2137,10 +2232,10 @@ class FCPVolumeManager(object):
             # the values are the connections of the FCP device
             fcp_connections = self.fcp_mgr.increase_fcp_connections(fcp_list, assigner_id)
             LOG.info("The connections of FCP devices after "
-                     "being increased is: {}.".format(fcp_connections))
+                     "being increased is: %s.", fcp_connections)
         except Exception as err:
             LOG.error("Failed to increase connections of the FCP devices on %s in "
-                      "database because %s." % (assigner_id, str(err)))
+                      "database because %s.", assigner_id, str(err))
             if do_rollback:
                 # Rollback for the following completed operations:
                 # 1. operations on FCP DB done by get_volume_connector() and reserve_fcp_devices()
@@ -2152,32 +2247,45 @@ class FCPVolumeManager(object):
         if is_root_volume:
             LOG.info("We are attaching root volume, dedicating FCP devices %s "
                      "to virtual machine %s has been done by refresh_bootmap; "
-                     "skip the remain steps of volume attachment."
-                     % (fcp_list, assigner_id))
+                     "skip the remain steps of volume attachment.",
+                     fcp_list, assigner_id)
             return []
 
         # Operation on z/VM: dedicate FCP devices to the assigner_id in z/VM
         try:
+            # Dedicate an FCP device on z/VM only when its connections is 1,
+            # which means this is 1st volume attached to this FCP device,
+            # otherwise the FCP device has been dedicated already.
+            first_attach_fcps = [fcp for fcp in fcp_list
+                                 if fcp_connections[fcp] == 1]
             for fcp in fcp_list:
-                # Dedicate the FCP device on z/VM only when connections are 1,
-                # which means this is 1st volume attached to this FCP device,
-                # otherwise the FCP device has been dedicated already.
-                # if _dedicate_fcp() raise exception for an FCP device, we must stop
-                # the whole attachment to go to except-block to do rollback operations.
-                if fcp_connections[fcp] == 1:
-                    LOG.info("Start to dedicate FCP %s to "
-                             "%s in z/VM." % (fcp, assigner_id))
-                    # dedicate the FCP to the assigner in z/VM
-                    self._dedicate_fcp(fcp, assigner_id)
-                    LOG.info("Dedicating FCP %s to %s in z/VM is "
-                             "done." % (fcp, assigner_id))
-                else:
+                if fcp not in first_attach_fcps:
                     LOG.info("This is not the first time to "
                              "attach volume to FCP %s, "
-                             "skip dedicating the FCP device in z/VM." % fcp)
+                             "skip dedicating the FCP device in z/VM.", fcp)
+
+            def _dedicate_one_fcp(fcp):
+                LOG.info("Start to dedicate FCP %s to "
+                         "%s in z/VM.", fcp, assigner_id)
+                # dedicate the FCP to the assigner in z/VM
+                self._dedicate_fcp(fcp, assigner_id)
+                LOG.info("Dedicating FCP %s to %s in z/VM is "
+                         "done.", fcp, assigner_id)
+
+            if first_attach_fcps:
+                # The SMT requests behind _dedicate_fcp() are independent
+                # per FCP device (one per path), overlap them so multipath
+                # attach does not pay one SMT round-trip per path.
+                # if _dedicate_fcp() raise exception for an FCP device, we must stop
+                # the whole attachment to go to except-block to do rollback operations.
+                with futures.ThreadPoolExecutor(
+                        max_workers=len(first_attach_fcps)) as executor:
+                    # list() consumes the map iterator so that
+                    # the first exception, if any, is re-raised here
+                    list(executor.map(_dedicate_one_fcp, first_attach_fcps))
         except Exception as err:
             LOG.error("Failed to dedicate FCP devices to %s in "
-                      "z/VM because %s." % (assigner_id, str(err)))
+                      "z/VM because %s.", assigner_id, str(err))
             if do_rollback:
                 # Rollback must be done in the following order for the following completed operations:
                 # 1. operations on z/VM done by _dedicate_fcp()
@@ -2191,17 +2299,17 @@ class FCPVolumeManager(object):
         # Operation on VM operating system: online the volume in the virtual machine
         try:
             LOG.info("Start to configure volume in the operating "
-                     "system of %s." % assigner_id)
+                     "system of %s.", assigner_id)
             self._add_disks(fcp_list, assigner_id, target_wwpns,
                             target_lun, multipath, os_version,
                             mount_point)
             LOG.info("Configuring volume in the operating "
-                     "system of %s is done." % assigner_id)
+                     "system of %s is done.", assigner_id)
             LOG.info("Attaching volume to FCP devices %s on virtual machine %s is "
-                     "done." % (fcp_list, assigner_id))
+                     "done.", fcp_list, assigner_id)
         except Exception as err:
             LOG.error("Failed to configure volume in the OS of %s "
-                      "because %s." % (assigner_id, str(err)))
+                      "because %s.", assigner_id, str(err))
             if do_rollback:
                 # Rollback must be done in the following order for the following completed operations:
                 # 1. operations on VM OS done by _add_disks()
@@ -2226,14 +2334,14 @@ class FCPVolumeManager(object):
         """
         LOG.info("Enter rollback function: _rollback_decreased_connections")
         # Before rollback, print information for debug
-        fcp_usage = [self.get_fcp_usage(fcp) for fcp in fcp_list]
-        LOG.info("Before rollback, the usage of the FCP devices is: %s" % fcp_usage)
+        fcp_usage = self.db.get_usage_of_fcps(fcp_list)
+        LOG.info("Before rollback, the usage of the FCP devices is: %s", fcp_usage)
         for fcp in fcp_list:
             with zvmutils.ignore_errors():
                 self.db.increase_connections_by_assigner(fcp, assigner_id)
         # After rollback, print information for debug
-        fcp_usage = [self.get_fcp_usage(fcp) for fcp in fcp_list]
-        LOG.info("After rollback, the usage of the FCP devices is: %s" % fcp_usage)
+        fcp_usage = self.db.get_usage_of_fcps(fcp_list)
+        LOG.info("After rollback, the usage of the FCP devices is: %s", fcp_usage)
         LOG.info("Exit rollback function: _rollback_decreased_connections")
 
     def _rollback_undedicated_fcp_devices(self, fcp_connections, assigner_id):
@@ -2255,7 +2363,7 @@ class FCPVolumeManager(object):
                 if fcp_connections[fcp] == 0:
                     # dedicate the FCP to the assigner in z/VM
                     self._dedicate_fcp(fcp, assigner_id)
-                    LOG.info("Rollback on z/VM: dedicate FCP device: %s" % fcp)
+                    LOG.info("Rollback on z/VM: dedicate FCP device: %s", fcp)
         LOG.info("Exit rollback function: _rollback_undedicated_fcp_devices")
 
     def _rollback_removed_disks(self, fcp_connections, assigner_id, target_wwpns, target_lun,
@@ -2278,8 +2386,7 @@ class FCPVolumeManager(object):
                             target_wwpns, target_lun,
                             multipath, os_version, mount_point)
             LOG.info("Rollback on VM operating system: "
-                     "online volume for virtual machine %s"
-                     % assigner_id)
+                     "online volume for virtual machine %s", assigner_id)
         LOG.info("Exit rollback function: _rollback_removed_disks")
 
     def volume_refresh_bootmap(self, fcpchannels, wwpns, lun,
@@ -2302,7 +2409,7 @@ class FCPVolumeManager(object):
                                                          transportfiles=transportfiles,
                                                          guest_networks=guest_networks,
                                                          min_fcp_paths_count=min_fcp_paths_count)
-        LOG.debug('Exit lock of volume_refresh_bootmap with ret %s.' % ret)
+        LOG.debug('Exit lock of volume_refresh_bootmap with ret %s.', ret)
         return ret
 
     @utils.synchronized('volumeAttachOrDetach-{connection_info[assigner_id]}')
@@ -2327,17 +2434,17 @@ class FCPVolumeManager(object):
         is_root_volume = connection_info.get('is_root_volume', False)
         fcp_template_id = connection_info['fcp_template_id']
         do_rollback = connection_info.get('do_rollback', True)
-        LOG.info("attach with do_rollback as {}".format(do_rollback))
+        LOG.info("attach with do_rollback as %s", do_rollback)
 
         if is_root_volume is False and \
                 not zvmutils.check_userid_exist(assigner_id):
-            LOG.error("The virtual machine '%s' does not exist on z/VM." % assigner_id)
+            LOG.error("The virtual machine '%s' does not exist on z/VM.", assigner_id)
             raise exception.SDKObjectNotExistError(
                     obj_desc=("Guest '%s'" % assigner_id), modID='volume')
         else:
             # transfer to lower cases
-            fcp_list = [x.lower() for x in fcps]
-            target_wwpns = [wwpn.lower() for wwpn in wwpns]
+            fcp_list = list(map(str.lower, fcps))
+            target_wwpns = list(map(str.lower, wwpns))
             try:
                 self._do_attach(fcp_list, assigner_id,
                                 target_wwpns, target_lun,
@@ -2345,13 +2452,12 @@ class FCPVolumeManager(object):
                                 mount_point, is_root_volume,
                                 fcp_template_id, do_rollback=do_rollback)
             except Exception:
-                for fcp in fcp_list:
-                    with zvmutils.ignore_errors():
-                        _userid, _reserved, _conns, _tmpl_id = self.get_fcp_usage(fcp)
-                        LOG.info("After rollback, property of FCP device %s "
-                                 "is (assigner_id: %s, reserved:%s, "
-                                 "connections: %s, FCP Multipath Template id: %s)."
-                                 % (fcp, _userid, _reserved, _conns, _tmpl_id))
+                with zvmutils.ignore_errors():
+                    fcp_usage = self.db.get_usage_of_fcps(fcp_list)
+                    LOG.info("After rollback, the properties of the FCP "
+                             "devices (fcp_id, assigner_id, reserved, "
+                             "connections, FCP Multipath Template id) "
+                             "are: %s", fcp_usage)
                 raise
 
     def _undedicate_fcp(self, fcp, assigner_id):
@@ -2405,7 +2511,7 @@ class FCPVolumeManager(object):
             i.e. no rollback will be done if any phase fails.
         """
         LOG.info("Start to detach volume on virtual machine %s from "
-                 "FCP devices %s" % (assigner_id, fcp_list))
+                 "FCP devices %s", assigner_id, fcp_list)
 
         # Operation on FCP DB: decrease connections by 1
         # fcp_connections is like {'1a10': 0, '1b10': 2}
@@ -2421,11 +2527,11 @@ class FCPVolumeManager(object):
             if update_connections_only:
                 LOG.info("Update connections only, undedicating FCP devices %s "
                          "from virtual machine %s has been done; skip the remain "
-                         "steps of volume detachment" % (fcp_list, assigner_id))
+                         "steps of volume detachment", fcp_list, assigner_id)
             else:
                 LOG.info("We are detaching root volume, undedicating FCP devices %s "
                          "from virtual machine %s has been done; skip the remain "
-                         "steps of volume detachment" % (fcp_list, assigner_id))
+                         "steps of volume detachment", fcp_list, assigner_id)
             return
 
         # when detaching volumes, if userid not exist, no need to
@@ -2439,7 +2545,7 @@ class FCPVolumeManager(object):
         # Operation on VM operating system: offline the volume in the virtual machine
         try:
             LOG.info("Start to remove volume in the operating "
-                     "system of %s." % assigner_id)
+                     "system of %s.", assigner_id)
             # Case1: this volume is NOT the last volume of this VM.
             #   The connections of all the FCP devices are non-zero normally, for example:
             #       sum(fcp_connections.values()) > 0
@@ -2461,9 +2567,10 @@ class FCPVolumeManager(object):
             self._remove_disks(fcp_list, assigner_id, target_wwpns, target_lun,
                                multipath, os_version, mount_point, total_connections)
             LOG.info("Removing volume in the operating "
-                     "system of %s is done." % assigner_id)
+                     "system of %s is done.", assigner_id)
         except Exception as err:
-            LOG.error("Failed to remove disks in the OS of %s because %s." % (assigner_id, str(err)))
+            LOG.error("Failed to remove disks in the OS of %s because %s.",
+                      assigner_id, str(err))
             if do_rollback:
                 self._rollback_removed_disks(fcp_connections, assigner_id, target_wwpns, target_lun,
                                              multipath, os_version, mount_point)
@@ -2477,17 +2584,18 @@ class FCPVolumeManager(object):
                     # As _remove_disks() has been run successfully,
                     # we need to try our best to undedicate every FCP device
                     LOG.info("Start to undedicate FCP %s from "
-                             "%s on z/VM." % (fcp, assigner_id))
+                             "%s on z/VM.", fcp, assigner_id)
                     self._undedicate_fcp(fcp, assigner_id)
                     LOG.info("FCP %s undedicated from %s on z/VM is "
-                         "done." % (fcp, assigner_id))
+                         "done.", fcp, assigner_id)
                 else:
                     LOG.info("The connections of FCP device %s is not 0, "
-                             "skip undedicating the FCP device on z/VM." % fcp)
+                             "skip undedicating the FCP device on z/VM.", fcp)
             LOG.info("Detaching volume on virtual machine %s from FCP devices %s is "
-                     "done." % (assigner_id, fcp_list))
+                     "done.", assigner_id, fcp_list)
         except Exception as err:
-            LOG.error("Failed to undedicate the FCP devices on %s because %s." % (assigner_id, str(err)))
+            LOG.error("Failed to undedicate the FCP devices on %s because %s.",
+                      assigner_id, str(err))
             if do_rollback:
                 # Rollback for the following completed operations:
                 # 1. operations on z/VM done by _udedicate_fcp()
@@ -2514,10 +2622,10 @@ class FCPVolumeManager(object):
         update_connections_only = connection_info.get(
                 'update_connections_only', False)
         do_rollback = connection_info.get('do_rollback', True)
-        LOG.info("detach with do_rollback as {}".format(do_rollback))
+        LOG.info("detach with do_rollback as %s", do_rollback)
         # transfer to lower cases
-        fcp_list = [x.lower() for x in fcps]
-        target_wwpns = [wwpn.lower() for wwpn in wwpns]
+        fcp_list = list(map(str.lower, fcps))
+        target_wwpns = list(map(str.lower, wwpns))
         try:
             self._do_detach(fcp_list, assigner_id,
                             target_wwpns, target_lun,
@@ -2525,13 +2633,12 @@ class FCPVolumeManager(object):
                             is_root_volume, update_connections_only,
                             do_rollback=do_rollback)
         except Exception:
-            for fcp in fcp_list:
-                with zvmutils.ignore_errors():
-                    _userid, _reserved, _conns, _tmpl_id = self.get_fcp_usage(fcp)
-                    LOG.info("After rollback, property of FCP device %s "
-                             "is (assigner_id: %s, reserved:%s, "
-                             "connections: %s, FCP Multipath Template id: %s)."
-                             % (fcp, _userid, _reserved, _conns, _tmpl_id))
+            with zvmutils.ignore_errors():
+                fcp_usage = self.db.get_usage_of_fcps(fcp_list)
+                LOG.info("After rollback, the properties of the FCP "
+                         "devices (fcp_id, assigner_id, reserved, "
+                         "connections, FCP Multipath Template id) "
+                         "are: %s", fcp_usage)
             raise
 
     @utils.synchronized('volumeAttachOrDetach-{assigner_id}')
@@ -2621,8 +2728,8 @@ class FCPVolumeManager(object):
                 (is_reserved_changed, fcp_list,
                  fcp_template_id, empty_fcp_list_reason) = self.fcp_mgr.allocate_fcp_devices(
                     assigner_id, fcp_template_id, sp_name, pchid_info)
-                LOG.info("get_volume_connector: Exit allocate_fcp_devices {}".format(
-                    [f['fcp_id'] for f in fcp_list]))
+                LOG.info("get_volume_connector: Exit allocate_fcp_devices "
+                         "%s", [f['fcp_id'] for f in fcp_list])
             else:
                 LOG.info("get_volume_connector: Enter release_fcp_devices.")
                 # fcp_list is a list of sqlite3.Row objects, it is similar as the example below:
@@ -2631,8 +2738,8 @@ class FCPVolumeManager(object):
                 #  {'fcp_id':'1E05', 'path':5, 'pchid':'EEEE', 'wwpn_npiv':'cc', 'wwpn_phy':'zz'}]
                 is_reserved_changed, fcp_list = self.fcp_mgr.release_fcp_devices(
                     assigner_id, fcp_template_id)
-                LOG.info("get_volume_connector: Exit release_fcp_devices {}".format(
-                    [f['fcp_id'] for f in fcp_list]))
+                LOG.info("get_volume_connector: Exit release_fcp_devices "
+                         "%s", [f['fcp_id'] for f in fcp_list])
 
             # get zhypinfo
             zhypinfo = utils.get_zhypinfo()
@@ -2669,9 +2776,8 @@ class FCPVolumeManager(object):
                     wwpns.append(wwpn_npiv)
                     phy_virt_wwpn_map[wwpn_npiv] = fcp['wwpn_phy']
                     # populate pchid_fcp_map
-                    if fcp['pchid'].upper() not in pchid_fcp_map:
-                        pchid_fcp_map[fcp['pchid'].upper()] = []
-                    pchid_fcp_map[fcp['pchid'].upper()].append(fcp['fcp_id'].upper())
+                    pchid_fcp_map.setdefault(
+                        fcp['pchid'].upper(), []).append(fcp['fcp_id'].upper())
 
                 # return the hypervisor_hostname+VMuserid
                 # as host to be used by storage provider
@@ -2695,11 +2801,8 @@ class FCPVolumeManager(object):
             return connector
 
     def check_fcp_exist_in_db(self, fcp, raise_exec=True):
-        all_fcps_raw = self.db.get_all()
-        all_fcps = []
-        for item in all_fcps_raw:
-            all_fcps.append(item['fcp_id'].lower())
-        if fcp not in all_fcps:
+        # fcp_id column is COLLATE NOCASE, so the lookup is case-insensitive
+        if not self.db.fcp_exist_in_db(fcp):
             if raise_exec:
                 LOG.error("fcp %s not exist in db!", fcp)
                 raise exception.SDKObjectNotExistError(